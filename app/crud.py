@@ -1,26 +1,39 @@
-"""CRUD operations for Beer entities.
+"""CRUD operations for Beer entities, display settings and stored images.
 
 Each function expects a SQLModel Session (FastAPI dependency supplies it).
 Errors are surfaced via HTTPException for straightforward API integration.
+Hot read queries are built with ``lambda_stmt`` so SQLAlchemy caches the
+constructed statement as well as its compiled SQL.
 """
 
 from typing import Optional, Sequence
 
+from sqlalchemy import delete, lambda_stmt, update
 from sqlmodel import Session, select
 from fastapi import HTTPException, status
 
-from .models import Beer, BeerCreate, BeerUpdate
+from . import wall_cache
+from .models import (
+    Beer,
+    BeerCreate,
+    BeerUpdate,
+    DisplaySettings,
+    StoredImage,
+    StoredImageData,
+)
 
 
 def get_beers(*, session: Session, skip: int = 0, limit: int = 100) -> Sequence[Beer]:
     """Return beers ordered by tap number with optional pagination."""
-    stmt = select(Beer).order_by(Beer.tap_number).offset(skip).limit(limit)
-    return session.exec(stmt).all()
+    stmt = lambda_stmt(lambda: select(Beer).order_by(Beer.tap_number))
+    stmt += lambda s: s.offset(skip).limit(limit)
+    return session.exec(stmt).scalars().all()
 
 
 def get_beer(*, session: Session, beer_id: int) -> Optional[Beer]:
     """Fetch a single beer by id or raise 404 if absent."""
-    beer = session.get(Beer, beer_id)
+    stmt = lambda_stmt(lambda: select(Beer).where(Beer.id == beer_id))
+    beer = session.exec(stmt).scalar_one_or_none()
     if not beer:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=f"Beer {beer_id} not found"
@@ -28,29 +41,76 @@ def get_beer(*, session: Session, beer_id: int) -> Optional[Beer]:
     return beer
 
 
+def get_settings(*, session: Session) -> Optional[DisplaySettings]:
+    """Return the singleton display settings row (id=1), if present."""
+    stmt = lambda_stmt(lambda: select(DisplaySettings).where(DisplaySettings.id == 1))
+    return session.exec(stmt).scalar_one_or_none()
+
+
 def create_beer(*, session: Session, beer_in: BeerCreate) -> Beer:
     """Persist a new beer record from a validated create schema."""
     beer = Beer(**beer_in.model_dump())
     session.add(beer)
+    wall_cache.invalidate(session)
     session.commit()
     session.refresh(beer)
     return beer
 
 
+def create_beers(*, session: Session, beers_in: Sequence[BeerCreate]) -> list[Beer]:
+    """Persist many beers in one transaction, i.e. a single commit."""
+    beers = [Beer(**beer_in.model_dump()) for beer_in in beers_in]
+    if not beers:
+        return beers
+    session.add_all(beers)
+    session.flush()
+    # Detach so the commit does not expire them (one reload SELECT per beer)
+    for beer in beers:
+        session.expunge(beer)
+    wall_cache.invalidate(session)
+    session.commit()
+    return beers
+
+
 def update_beer(*, session: Session, beer_id: int, beer_in: BeerUpdate) -> Beer:
-    """Apply a partial update (PATCH semantics) to a beer and return it."""
-    beer = get_beer(session=session, beer_id=beer_id)
+    """Apply a partial update (PATCH semantics) to a beer and return it.
+
+    Issues a single ``UPDATE ... RETURNING`` instead of a SELECT followed by
+    an UPDATE; an empty patch degrades to a plain lookup.
+    """
     beer_data = beer_in.model_dump(exclude_unset=True)
-    for key, value in beer_data.items():
-        setattr(beer, key, value)
-    session.add(beer)
+    if not beer_data:
+        return get_beer(session=session, beer_id=beer_id)
+    stmt = update(Beer).where(Beer.id == beer_id).values(**beer_data).returning(Beer)
+    beer = session.exec(stmt).scalar_one_or_none()
+    if beer is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"Beer {beer_id} not found"
+        )
+    # Detach so the returned row is not expired (and re-selected) by the commit
+    session.expunge(beer)
+    wall_cache.invalidate(session)
     session.commit()
-    session.refresh(beer)
     return beer
 
 
 def delete_beer(*, session: Session, beer_id: int) -> None:
     """Delete a beer by id (idempotent: raises 404 if not found)."""
-    beer = get_beer(session=session, beer_id=beer_id)
-    session.delete(beer)
+    result = session.exec(delete(Beer).where(Beer.id == beer_id))
+    if result.rowcount == 0:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"Beer {beer_id} not found"
+        )
+    wall_cache.invalidate(session)
     session.commit()
+
+
+def store_image(
+    *, session: Session, kind: str, ref_id: Optional[int], content_type: str, data: bytes
+) -> StoredImage:
+    """Add image metadata plus its BLOB row; the caller commits."""
+    img = StoredImage(kind=kind, ref_id=ref_id, content_type=content_type)
+    session.add(img)
+    session.flush()
+    session.add(StoredImageData(id=img.id, data=data))
+    return img
@@ -2,17 +2,39 @@
 
 import os
 import logging
+import time
+from contextlib import contextmanager
 from sqlmodel import SQLModel, create_engine, Session
 from sqlalchemy import event
+from sqlalchemy.pool import QueuePool, StaticPool
 from sqlalchemy.exc import SQLAlchemyError
 
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
 _db_path = os.getenv("DB_PATH", "/data/opentapwall.db")
 DB_URL = _db_path if _db_path.startswith("sqlite:") else f"sqlite:///{_db_path}"
 
 if not _db_path.startswith("sqlite:"):
     os.makedirs(os.path.dirname(_db_path), exist_ok=True)
 
-engine = create_engine(DB_URL, connect_args={"check_same_thread": False})
+if ":memory:" in DB_URL or DB_URL == "sqlite://":
+    # In-memory databases live on a single connection; share it across threads.
+    engine = create_engine(
+        DB_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+else:
+    # Keep a small set of open connections so requests skip sqlite3_open().
+    # No pre-ping/recycle: a local SQLite file connection cannot go stale.
+    engine = create_engine(
+        DB_URL,
+        connect_args={"check_same_thread": False},
+        poolclass=QueuePool,
+        pool_size=5,
+        max_overflow=10,
+    )
 
 
 @event.listens_for(engine, "connect")
@@ -22,6 +44,10 @@ def _set_sqlite_pragmas(dbapi_con, _):
     cur.execute("PRAGMA journal_mode=WAL;")
     cur.execute("PRAGMA synchronous=NORMAL;")
     cur.execute("PRAGMA foreign_keys=ON;")
+    cur.execute("PRAGMA cache_size=-20000;")  # ~20MB page cache
+    cur.execute("PRAGMA mmap_size=268435456;")  # 256MB memory-mapped I/O
+    cur.execute("PRAGMA temp_store=MEMORY;")
+    cur.execute("PRAGMA busy_timeout=5000;")
     cur.close()
 
 
@@ -32,24 +58,62 @@ try:
 except ImportError as exc:
     logging.warning("[db] Could not import models pre-create_all: %s", exc)
 
-SQLModel.metadata.create_all(engine)
+PAGE_SIZE = 8192
+# Bump whenever _lightweight_migrate gains a new step.
+SCHEMA_VERSION = 3
 
 
 def _lightweight_migrate():
     """Perform simple additive, idempotent schema adjustments.
 
+    Gated on ``PRAGMA user_version``: once a database reaches
+    ``SCHEMA_VERSION`` startup costs a single PRAGMA read. The steps run
+    inside ``BEGIN IMMEDIATE`` so parallel workers cannot race the ALTERs.
+
     Ensures:
-        * beer table has ``image_id`` column
+        * database uses ``PAGE_SIZE`` pages (rebuilt via VACUUM; best effort)
+        * beer table has ``image_id`` column and ``tap_number`` index
         * displaysettings table with ``logo_image_id`` column and singleton row
-        * storedimage table for BLOB image storage
+        * storedimage metadata table, with BLOBs moved into storedimagedata
+        * storedimage.created_at holds integer Unix epoch microseconds
+        * wallstate table with its singleton revision row
     """
     try:
         with engine.connect() as conn:
+            if conn.exec_driver_sql("PRAGMA user_version").scalar() >= SCHEMA_VERSION:
+                return
+
+            # page_size only applies to a WAL database after a rollback-journal VACUUM.
+            # The rebuild is optional and fails while other connections hold the
+            # file open, so it must never block the schema steps below.
+            if conn.exec_driver_sql("PRAGMA page_size").scalar() != PAGE_SIZE:
+                try:
+                    logging.info("[migrate] Rebuilding database with page_size=%d", PAGE_SIZE)
+                    conn.exec_driver_sql("PRAGMA journal_mode=DELETE")
+                    conn.exec_driver_sql(f"PRAGMA page_size={PAGE_SIZE}")
+                    conn.exec_driver_sql("VACUUM")
+                    conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+                except SQLAlchemyError as e:
+                    logging.warning("[migrate] Skipping page_size rebuild: %s", e)
+                    conn.rollback()
+                    try:
+                        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+                    except SQLAlchemyError:
+                        pass
+                    conn.rollback()
+
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            # Another worker may have finished while we waited for the write lock
+            if conn.exec_driver_sql("PRAGMA user_version").scalar() >= SCHEMA_VERSION:
+                conn.rollback()
+                return
+            complete = True
+
             # Determine existing tables
             tables = {r[0] for r in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type='table'").fetchall()}
             if "beer" not in tables:
                 logging.info("[migrate] 'beer' table missing; running create_all again")
-                SQLModel.metadata.create_all(engine)
+                SQLModel.metadata.create_all(conn)
                 tables = {r[0] for r in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type='table'").fetchall()}
 
             if "beer" in tables:
@@ -60,8 +124,15 @@ def _lightweight_migrate():
                         logging.info("[migrate] Adding 'image_id' column to beer")
                         conn.exec_driver_sql("ALTER TABLE beer ADD COLUMN image_id INTEGER")
                     except SQLAlchemyError as e:
+                        complete = False
                         logging.warning("[migrate] Could not add image_id column: %s", e)
 
+                indexes = {r[0] for r in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type='index'").fetchall()}
+                if "ix_beer_tap_number" not in indexes:
+                    logging.info("[migrate] Creating 'ix_beer_tap_number' index")
+                    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_beer_tap_number ON beer (tap_number)")
+                    conn.exec_driver_sql("ANALYZE ix_beer_tap_number")
+
             conn.exec_driver_sql("CREATE TABLE IF NOT EXISTS displaysettings (id INTEGER PRIMARY KEY, title VARCHAR, logo_image_id INTEGER)")
             ds_cols = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(displaysettings);").fetchall()}
             if "logo_image_id" not in ds_cols:
@@ -69,22 +140,134 @@ def _lightweight_migrate():
                     logging.info("[migrate] Adding 'logo_image_id' column to displaysettings")
                     conn.exec_driver_sql("ALTER TABLE displaysettings ADD COLUMN logo_image_id INTEGER")
                 except SQLAlchemyError as e:
+                    complete = False
                     logging.warning("[migrate] Could not add logo_image_id: %s", e)
             row = conn.exec_driver_sql("SELECT id FROM displaysettings WHERE id=1").fetchone()
             if not row:
                 conn.exec_driver_sql("INSERT INTO displaysettings (id, title, logo_image_id) VALUES (1, 'What’s on Tap', NULL)")
 
-            conn.exec_driver_sql("CREATE TABLE IF NOT EXISTS storedimage (id INTEGER PRIMARY KEY, kind VARCHAR, ref_id INTEGER, content_type VARCHAR, data BLOB, created_at VARCHAR)")
+            # storedimage needs no (id, content_type) covering index: its rows hold no
+            # BLOBs, and SQLite always answers id lookups with a rowid SEARCH anyway
+            conn.exec_driver_sql("CREATE TABLE IF NOT EXISTS storedimage (id INTEGER PRIMARY KEY, kind VARCHAR, ref_id INTEGER, content_type VARCHAR, created_at INTEGER)")
+            conn.exec_driver_sql("CREATE TABLE IF NOT EXISTS storedimagedata (id INTEGER PRIMARY KEY REFERENCES storedimage (id), data BLOB NOT NULL)")
+            si_cols = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(storedimage);").fetchall()}
+            if "data" in si_cols:
+                try:
+                    logging.info("[migrate] Moving image BLOBs from storedimage to storedimagedata")
+                    conn.exec_driver_sql("INSERT OR IGNORE INTO storedimagedata (id, data) SELECT id, data FROM storedimage WHERE data IS NOT NULL")
+                    conn.exec_driver_sql("ALTER TABLE storedimage DROP COLUMN data")
+                except SQLAlchemyError as e:
+                    complete = False
+                    logging.warning("[migrate] Could not split storedimage BLOBs: %s", e)
+            # Earlier versions stored created_at as a datetime string
+            conn.exec_driver_sql(
+                "UPDATE storedimage SET created_at = CAST(ROUND((julianday(created_at) - 2440587.5) * 86400000000) AS INTEGER) "
+                "WHERE typeof(created_at) = 'text'"
+            )
+
+            # Start from the current time so revisions never repeat across database resets
+            conn.exec_driver_sql("CREATE TABLE IF NOT EXISTS wallstate (id INTEGER PRIMARY KEY, revision INTEGER NOT NULL)")
+            conn.exec_driver_sql(
+                "INSERT OR IGNORE INTO wallstate (id, revision) VALUES (1, ?)", (time.time_ns() // 1000,)
+            )
+
+            # Leave the version unchanged after a partial run so the next start retries
+            if complete:
+                conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.commit()
     except (SQLAlchemyError, OSError) as exc:
         logging.warning(
             "Lightweight migration skipped or failed (%s): %s", type(exc).__name__, exc
         )
 
 
-_lightweight_migrate()
+@contextmanager
+def _migrate_lock():
+    """Hold an exclusive file lock so only one worker process migrates at a time.
+
+    The lock file sits next to the database, so containers sharing the data
+    volume also serialize. In-memory databases and non-POSIX platforms skip it.
+    """
+    database = engine.url.database
+    if fcntl is None or not database or database == ":memory:":
+        yield
+        return
+    # O_CREAT without O_TRUNC: never truncate, and refuse to follow a symlink
+    fd = os.open(
+        f"{database}.migrate.lock", os.O_RDWR | os.O_CREAT | getattr(os, "O_NOFOLLOW", 0), 0o600
+    )
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def _schema_is_current() -> bool:
+    """Return True if ``PRAGMA user_version`` already matches ``SCHEMA_VERSION``."""
+    try:
+        with engine.connect() as conn:
+            return conn.exec_driver_sql("PRAGMA user_version").scalar() >= SCHEMA_VERSION
+    except SQLAlchemyError:
+        return False
+
+
+def init_db():
+    """Create missing tables and run the lightweight migration.
+
+    Called explicitly at application startup (not at import). On an already
+    migrated database this is a single ``PRAGMA user_version`` read, so worker
+    processes don't each repeat the ``create_all`` schema introspection.
+    """
+    with _migrate_lock():
+        if _schema_is_current():
+            return
+        SQLModel.metadata.create_all(engine)
+        _lightweight_migrate()
+
+
+def optimize_db():
+    """Refresh query planner statistics via ``PRAGMA optimize``.
+
+    Cheap when nothing changed; intended for startup, shutdown and a daily run.
+    """
+    try:
+        raw = engine.raw_connection()
+        try:
+            cur = raw.cursor()
+            cur.execute("PRAGMA analysis_limit=0;")  # tables are small; analyze fully
+            cur.execute("PRAGMA optimize;")
+            cur.close()
+        finally:
+            raw.close()
+    except (SQLAlchemyError, OSError) as exc:
+        logging.warning("[db] PRAGMA optimize failed (%s): %s", type(exc).__name__, exc)
+
+
+def iter_blob(table: str, column: str, rowid: int, chunk_size: int = 64 * 1024):
+    """Yield a BLOB cell in chunks using SQLite incremental BLOB I/O.
+
+    Holds a pooled connection only while iterating, so the full value is never
+    materialized as a single ``bytes`` object.
+    """
+    raw = engine.raw_connection()
+    try:
+        with raw.driver_connection.blobopen(table, column, rowid, readonly=True) as blob:
+            while chunk := blob.read(chunk_size):
+                yield chunk
+    finally:
+        raw.close()
 
 
 def get_session():
-    """FastAPI dependency yielding a database session (context-managed)."""
+    """FastAPI dependency yielding a database session (context-managed).
+
+    Async handlers may hand the session to ``asyncio.to_thread``; that is safe
+    because connections are opened with ``check_same_thread=False`` and the
+    session is only ever used by one thread at a time.
+    """
     with Session(engine) as session:
         yield session
@@ -1,20 +1,53 @@
 """FastAPI application entrypoint: routes, templates, and startup logic."""
 
+import asyncio
+import contextlib
+import os
+
 from fastapi import FastAPI, Request, Depends, UploadFile, File, HTTPException
-from fastapi.responses import HTMLResponse, Response
+from fastapi.responses import (
+    HTMLResponse,
+    ORJSONResponse,
+    Response,
+    StreamingResponse,
+)
+from sqlalchemy import func
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
 from sqlmodel import select, Session
 
-from .db import get_session, engine
-from .models import Beer, DisplaySettings, DisplaySettingsUpdate, StoredImage
+from . import wall_cache
+from .crud import get_settings, store_image
+from .db import get_session, engine, init_db, iter_blob, optimize_db
+from .models import Beer, DisplaySettings, DisplaySettingsUpdate, StoredImage, StoredImageData
 from .routers.beers import router as beers_router
-
-app = FastAPI(title="OpenTapWall")
+from .uploads import (
+    export_image,
+    iter_file,
+    open_exported_image,
+    read_image_upload,
+    remove_exported_image,
+)
+
+app = FastAPI(title="OpenTapWall", default_response_class=ORJSONResponse)
 app.include_router(beers_router)
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
 templates = Jinja2Templates(directory="app/templates")
+# Templates only change on deploy; skip per-render mtime checks unless asked
+templates.env.auto_reload = os.getenv("TEMPLATES_AUTO_RELOAD", "").lower() in ("1", "true", "yes")
+# Default location is a per-user 0700 directory whose owner Jinja verifies
+templates.env.bytecode_cache = FileSystemBytecodeCache()
+
+OPTIMIZE_INTERVAL_SECONDS = 24 * 60 * 60
+_optimize_task: asyncio.Task | None = None
+
+
+@app.on_event("startup")
+def migrate_db():
+    """Create/migrate the schema before any other startup hook touches it."""
+    init_db()
 
 
 @app.on_event("startup")
@@ -22,74 +55,179 @@ def seed_data():
     """Insert a few sample beers if database starts empty.
 
     Provides an immediate visual when the wall is first launched.
+    The emptiness check and the insert are one idempotent statement, so
+    parallel workers cannot seed twice.
     """
-    with Session(engine) as session:
-        existing = session.exec(select(Beer).limit(1)).first()
-        if not existing:
-            session.add_all([
-                Beer(tap_number=1, name="Pale Ale", style="APA", abv=5.2, ibu=35, ebc=12),
-                Beer(tap_number=2, name="Stout", style="Dry Stout", abv=4.5, ibu=40, ebc=80),
-                Beer(tap_number=3, name="IPA", style="West Coast IPA", abv=6.5, ibu=60, ebc=18),
-            ])
-            session.commit()
+    with engine.begin() as conn:
+        result = conn.exec_driver_sql(
+            "INSERT INTO beer (tap_number, name, style, abv, ibu, ebc) "
+            "SELECT * FROM (VALUES "
+            "(1, 'Pale Ale', 'APA', 5.2, 35, 12), "
+            "(2, 'Stout', 'Dry Stout', 4.5, 40, 80), "
+            "(3, 'IPA', 'West Coast IPA', 6.5, 60, 18)) "
+            "WHERE NOT EXISTS (SELECT 1 FROM beer)"
+        )
+        if result.rowcount:
+            wall_cache.invalidate(conn)
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """Return True if the request's If-None-Match lists ``etag``."""
+    if_none_match = request.headers.get("if-none-match", "")
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+
+async def _periodic_optimize():
+    """Re-run ``PRAGMA optimize`` once a day for long-running processes."""
+    while True:
+        await asyncio.sleep(OPTIMIZE_INTERVAL_SECONDS)
+        await asyncio.to_thread(optimize_db)
+
+
+@app.on_event("startup")
+async def start_db_maintenance():
+    """Refresh planner statistics and schedule the daily optimize task."""
+    global _optimize_task
+    await asyncio.to_thread(optimize_db)
+    _optimize_task = asyncio.create_task(_periodic_optimize())
+
+
+@app.on_event("shutdown")
+async def stop_db_maintenance():
+    """Cancel the periodic task and run a final ``PRAGMA optimize``."""
+    if _optimize_task is not None:
+        _optimize_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await _optimize_task
+    await asyncio.to_thread(optimize_db)
 
 
 @app.get("/", response_class=HTMLResponse)
 def wall(request: Request, session=Depends(get_session)):
-    """Render the public tap wall display."""
-    beers = session.exec(select(Beer).order_by(Beer.tap_number)).all()
-    settings = session.get(DisplaySettings, 1)
-    return templates.TemplateResponse("index.html", {"request": request, "beers": beers, "settings": settings})
+    """Render the public tap wall display.
+
+    The rendered page is cached until the shared wall revision changes, i.e.
+    the next beer/settings/image mutation in any worker (bypassed while
+    template auto-reload is enabled). Displays revalidate on every reload and
+    get a 304 while the revision is unchanged.
+    """
+    rev = wall_cache.revision(session)
+    use_cache = rev is not None and not templates.env.auto_reload
+    headers = {"Cache-Control": "no-cache"}
+    if use_cache:
+        headers["ETag"] = wall_cache.etag(rev)
+        if _etag_matches(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+    html = wall_cache.get_html(rev) if use_cache else None
+    if html is None:
+        # Plain rows are enough for rendering; skip ORM instance construction
+        beers = session.exec(
+            select(
+                Beer.id, Beer.tap_number, Beer.name, Beer.style,
+                Beer.abv, Beer.ibu, Beer.ebc, Beer.image_id,
+            ).order_by(Beer.tap_number)
+        ).all()
+        settings = get_settings(session=session)
+        html = templates.get_template("index.html").render(
+            {"request": request, "beers": beers, "settings": settings}
+        )
+        if use_cache:
+            wall_cache.store_html(rev, html)
+    return HTMLResponse(html, headers=headers)
 
 
 @app.get("/admin", response_class=HTMLResponse)
 def admin(request: Request, session=Depends(get_session)):
     """Render the administration interface for managing beers and settings."""
-    settings = session.get(DisplaySettings, 1)
+    settings = get_settings(session=session)
     return templates.TemplateResponse("admin.html", {"request": request, "settings": settings})
 
 
 @app.patch("/settings", response_model=DisplaySettings)
 def update_settings(payload: DisplaySettingsUpdate, session=Depends(get_session)):
     """Update display settings (currently title only)."""
-    settings = session.get(DisplaySettings, 1)
+    settings = get_settings(session=session)
     if not settings:
         settings = DisplaySettings()
         session.add(settings)
         session.flush()
-    data = payload.model_dump(exclude_unset=True)
-    for k, v in data.items():
-        setattr(settings, k, v)
-    session.add(settings)
+    # settings is already tracked by the session, so no re-add is needed
+    settings.sqlmodel_update(payload.model_dump(exclude_unset=True))
+    wall_cache.invalidate(session)
     session.commit()
     session.refresh(settings)
     return settings
 
 
-@app.post("/settings/logo", response_model=DisplaySettings)
-def upload_logo(file: UploadFile = File(...), session=Depends(get_session)):
-    """Upload and persist a logo image (stored as BLOB)."""
-    if not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="File must be an image")
-    data = file.file.read()
-    if len(data) > 1_000_000:
-        raise HTTPException(status_code=413, detail="Logo too large (max 1MB)")
-    settings = session.get(DisplaySettings, 1) or DisplaySettings()
-    img = StoredImage(kind="logo", ref_id=None, content_type=file.content_type, data=data)
-    session.add(img)
-    session.flush()
-    settings.logo_image_id = img.id
+def _persist_logo(session: Session, content_type: str, data: bytes) -> DisplaySettings:
+    """Store logo bytes and point the display settings at them (blocking)."""
+    settings = get_settings(session=session) or DisplaySettings()
+    previous = None
+    if settings.logo_image_id is not None:
+        previous = session.exec(
+            select(StoredImage.id, StoredImage.created_at).where(
+                StoredImage.id == settings.logo_image_id
+            )
+        ).first()
+    img = store_image(
+        session=session, kind="logo", ref_id=None, content_type=content_type, data=data
+    )
+    img_id, img_created_at = img.id, img.created_at
+    settings.logo_image_id = img_id
     session.add(settings)
+    wall_cache.invalidate(session)
     session.commit()
+    # Every wall display fetches the logo; keep a copy servable from disk
+    export_image(img_id, img_created_at, data)
+    if previous:
+        remove_exported_image(*previous)
     session.refresh(settings)
     return settings
 
 
+@app.post("/settings/logo", response_model=DisplaySettings)
+async def upload_logo(file: UploadFile = File(...), session=Depends(get_session)):
+    """Upload and persist a logo image (stored as BLOB).
+
+    The upload is read on the event loop; the SQLite write runs in a thread.
+    """
+    data = await read_image_upload(file, label="Logo")
+    return await asyncio.to_thread(_persist_logo, session, file.content_type, data)
+
+
 @app.get("/images/{image_id}")
-def get_image(image_id: int, session=Depends(get_session)):
-    """Serve a stored image by id with basic caching headers."""
-    img = session.get(StoredImage, image_id)
-    if not img:
+def get_image(image_id: int, request: Request, session=Depends(get_session)):
+    """Serve a stored image by id with basic caching headers.
+
+    Stored images are immutable (uploads always create a new row), but ids can
+    be reused after a database reset, so the ETag combines the id with the
+    row's ``created_at``. Revalidation is answered with a 304 after a
+    metadata-only lookup, before the BLOB is read. Exported images (the logo)
+    are sent from disk; other image bytes are streamed with incremental BLOB
+    I/O rather than loaded whole.
+    """
+    row = session.exec(
+        select(StoredImage.created_at, StoredImage.content_type).where(
+            StoredImage.id == image_id
+        )
+    ).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Image not found")
+    created_at, content_type = row
+    etag = f'"img-{image_id}-{created_at}"'
+    headers = {"Cache-Control": "public, max-age=86400", "ETag": etag}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    exported = open_exported_image(image_id, created_at)
+    if exported is not None:
+        headers["Content-Length"] = str(os.fstat(exported.fileno()).st_size)
+        return StreamingResponse(iter_file(exported), media_type=content_type, headers=headers)
+    size = session.exec(
+        select(func.length(StoredImageData.data)).where(StoredImageData.id == image_id)
+    ).first()
+    if size is None:
         raise HTTPException(status_code=404, detail="Image not found")
-    headers = {"Cache-Control": "public, max-age=86400"}
-    return Response(content=img.data, media_type=img.content_type, headers=headers)
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(
+        iter_blob("storedimagedata", "data", image_id), media_type=content_type, headers=headers
+    )
@@ -3,23 +3,31 @@
 The module defines:
   * Beer / BeerBase / BeerCreate / BeerUpdate – core beer tap entities
   * DisplaySettings (+ update schema) – single row of wall display metadata
-  * StoredImage – generic BLOB storage for beer images and the logo
+  * StoredImage / StoredImageData – image metadata and its BLOB payload
+  * WallState – single row holding the wall revision shared by all workers
 
-Images are stored exclusively as BLOBs via the ``StoredImage`` table.
+Images are stored exclusively as BLOBs in the ``StoredImageData`` table,
+kept apart from the small ``StoredImage`` metadata rows.
 """
 
+import time
 from typing import Optional
-from datetime import datetime
 from sqlmodel import SQLModel, Field
 
 
+def _now_micros() -> int:
+    """Current UTC time as integer microseconds since the Unix epoch."""
+    return time.time_ns() // 1000
+
+
 class BeerBase(SQLModel):
     """Shared attributes for Beer variants (non-table base).
 
     Includes optional numeric stats. ``tap_number`` and ``name`` are required.
+    ``tap_number`` is indexed since every listing is ordered by it.
     """
 
-    tap_number: int
+    tap_number: int = Field(index=True)
     name: str
     style: Optional[str] = None
     abv: Optional[float] = None
@@ -74,16 +82,37 @@ class DisplaySettingsUpdate(SQLModel):
 
 
 class StoredImage(SQLModel, table=True):
-    """Generic binary image storage.
+    """Generic image metadata; the bytes live in ``StoredImageData``.
 
     ``kind`` distinguishes functional usage (e.g. "beer" or "logo"). ``ref_id``
     links back to a Beer when ``kind='beer'``; unused for logos.
-    ``data`` holds raw image bytes; ``content_type`` preserves the MIME type.
+    ``content_type`` preserves the MIME type; ``created_at`` is Unix epoch
+    microseconds.
     """
 
     id: Optional[int] = Field(default=None, primary_key=True)
     kind: str
     ref_id: Optional[int] = None
     content_type: str
+    created_at: int = Field(default_factory=_now_micros)
+
+
+class StoredImageData(SQLModel, table=True):
+    """Raw image bytes for a ``StoredImage`` row, sharing its id.
+
+    Kept in a separate table so BLOB pages never sit in the metadata B-tree.
+    """
+
+    id: Optional[int] = Field(default=None, primary_key=True, foreign_key="storedimage.id")
     data: bytes
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class WallState(SQLModel, table=True):
+    """Singleton row (id=1) with the rendered-wall revision.
+
+    ``revision`` is bumped in the same transaction as every beer, settings or
+    image mutation, so all worker processes see the same value.
+    """
+
+    id: int = Field(default=1, primary_key=True)
+    revision: int = Field(default_factory=_now_micros)
@@ -1,12 +1,13 @@
 """Beer API router: CRUD endpoints and image upload handler."""
 
-import os
+import asyncio
 
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, Form
 from sqlmodel import Session
 
 from ..db import get_session
-from .. import crud, models
+from .. import crud, models, wall_cache
+from ..uploads import read_image_upload
 
 router = APIRouter(prefix="/beers", tags=["beers"])
 
@@ -31,6 +32,14 @@ def add_beer(beer_in: models.BeerCreate, session: Session = Depends(get_session)
     return crud.create_beer(session=session, beer_in=beer_in)
 
 
+@router.post("/bulk", response_model=list[models.Beer], status_code=201)
+def add_beers(
+    beers_in: list[models.BeerCreate], session: Session = Depends(get_session)
+):
+    """Create many beers via a JSON list, committed once."""
+    return crud.create_beers(session=session, beers_in=beers_in)
+
+
 @router.patch("/{beer_id}", response_model=models.Beer)
 def edit_beer(
     beer_id: int, beer_in: models.BeerUpdate, session: Session = Depends(get_session)
@@ -45,34 +54,39 @@ def remove_beer(beer_id: int, session: Session = Depends(get_session)):
     crud.delete_beer(session=session, beer_id=beer_id)
 
 
-IMAGES_DIR = os.getenv("IMAGES_DIR", "/data/images")
-os.makedirs(IMAGES_DIR, exist_ok=True)
+def _persist_beer_image(
+    session: Session, beer_id: int, content_type: str, data: bytes
+) -> models.Beer:
+    """Store image bytes and link them to the beer (blocking)."""
+    beer = crud.get_beer(session=session, beer_id=beer_id)
+    img = crud.store_image(
+        session=session,
+        kind="beer",
+        ref_id=beer.id,
+        content_type=content_type,
+        data=data,
+    )
+    beer.image_id = img.id
+    session.add(beer)
+    wall_cache.invalidate(session)
+    session.commit()
+    session.refresh(beer)
+    return beer
 
 
 @router.post("/upload-image/{beer_id}", response_model=models.Beer)
-def upload_image(
+async def upload_image(
     beer_id: int, file: UploadFile = File(...), session: Session = Depends(get_session)
 ):
     """Attach an uploaded image to a beer (stored as BLOB).
 
-    Enforces a 1MB size cap.
+    Enforces a 1MB size cap. The SQLite write is offloaded to a thread so a
+    slow commit never blocks the event loop.
     """
-    if not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="File must be an image")
-    data = file.file.read()
-    if len(data) > 1_000_000:
-        raise HTTPException(status_code=413, detail="Image too large (max 1MB)")
-    beer = crud.get_beer(session=session, beer_id=beer_id)
-    img = models.StoredImage(
-        kind="beer", ref_id=beer.id, content_type=file.content_type, data=data
+    data = await read_image_upload(file)
+    return await asyncio.to_thread(
+        _persist_beer_image, session, beer_id, file.content_type, data
     )
-    session.add(img)
-    session.flush()
-    beer.image_id = img.id
-    session.add(beer)
-    session.commit()
-    session.refresh(beer)
-    return beer
 
 
 @router.post("/create", response_model=models.Beer)
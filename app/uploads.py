@@ -0,0 +1,80 @@
+"""Helpers for reading uploaded image files with a bounded memory footprint.
+
+Also exports selected images (the logo) to ``IMAGES_DIR`` so they can be served
+straight from disk; the database BLOB stays the source of truth.
+"""
+
+import io
+import logging
+import os
+from typing import BinaryIO, Iterator, Optional
+
+from fastapi import HTTPException, UploadFile
+
+MAX_IMAGE_BYTES = 1_000_000
+CHUNK_SIZE = 64 * 1024
+
+IMAGES_DIR = os.getenv("IMAGES_DIR", "/data/images")
+os.makedirs(IMAGES_DIR, exist_ok=True)
+
+
+async def read_image_upload(file: UploadFile, *, label: str = "Image") -> bytes:
+    """Validate and read an uploaded image in chunks, enforcing the 1MB cap.
+
+    Reading stops as soon as the cap is exceeded, so oversized uploads never
+    get fully buffered in memory.
+    """
+    if not file.content_type or not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    buf = io.BytesIO()
+    while chunk := await file.read(CHUNK_SIZE):
+        if buf.tell() + len(chunk) > MAX_IMAGE_BYTES:
+            raise HTTPException(status_code=413, detail=f"{label} too large (max 1MB)")
+        buf.write(chunk)
+    return buf.getvalue()
+
+
+def _export_path(image_id: int, created_at: int) -> str:
+    # created_at ties the file to its row: ids are reused after a database reset
+    return os.path.join(IMAGES_DIR, f"{image_id}-{created_at}")
+
+
+def export_image(image_id: int, created_at: int, data: bytes) -> None:
+    """Write image bytes to ``IMAGES_DIR`` (atomically); failures are logged only."""
+    path = _export_path(image_id, created_at)
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+    except OSError as exc:
+        logging.warning("[images] Could not export image %s: %s", image_id, exc)
+
+
+def remove_exported_image(image_id: int, created_at: int) -> None:
+    """Delete an image's on-disk copy if present; failures are logged only."""
+    try:
+        os.remove(_export_path(image_id, created_at))
+    except FileNotFoundError:
+        pass
+    except OSError as exc:
+        logging.warning("[images] Could not remove exported image %s: %s", image_id, exc)
+
+
+def open_exported_image(image_id: int, created_at: int) -> Optional[BinaryIO]:
+    """Open the on-disk copy of exactly this image row, if one was exported.
+
+    Opening up front (rather than returning a path) keeps the bytes readable
+    even if a newer logo upload removes the file before the response is sent.
+    """
+    try:
+        return open(_export_path(image_id, created_at), "rb")
+    except FileNotFoundError:
+        return None
+
+
+def iter_file(fh: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield an open file in chunks, closing it when done."""
+    with fh:
+        while chunk := fh.read(chunk_size):
+            yield chunk
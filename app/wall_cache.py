@@ -0,0 +1,58 @@
+"""Per-process cache of the rendered tap wall page.
+
+The cache key is the ``wallstate.revision`` row, which every mutation of beers,
+settings or images bumps via ``invalidate()`` inside its own transaction. Since
+the revision lives in the database, a change handled by any worker process
+invalidates the cached HTML of every worker on its next request.
+"""
+
+import threading
+from typing import Optional, Union
+
+from sqlalchemy import Connection, select, update
+from sqlmodel import Session
+
+from .models import WallState
+
+_lock = threading.Lock()
+_rendered: Optional[tuple[int, str]] = None
+
+
+def revision(session: Union[Session, Connection]) -> Optional[int]:
+    """Return the current wall revision (read it before querying data).
+
+    ``None`` means the revision row is missing and nothing should be cached.
+    """
+    return session.execute(select(WallState.revision).where(WallState.id == 1)).scalar()
+
+
+def etag(rev: int) -> str:
+    """Return the strong ETag identifying the wall at revision ``rev``.
+
+    Derived only from the shared revision, so every worker agrees on it. The
+    revision starts from a timestamp, so a reset database cannot repeat it.
+    """
+    return f'"wall-{rev}"'
+
+
+def invalidate(session: Union[Session, Connection]) -> None:
+    """Bump the shared revision; call before committing the mutation."""
+    session.execute(
+        update(WallState).where(WallState.id == 1).values(revision=WallState.revision + 1)
+    )
+
+
+def get_html(rev: int) -> Optional[str]:
+    """Return cached HTML if it was rendered for revision ``rev``."""
+    rendered = _rendered
+    if rendered is not None and rendered[0] == rev:
+        return rendered[1]
+    return None
+
+
+def store_html(rev: int, html: str) -> None:
+    """Cache HTML rendered from data read at revision ``rev``."""
+    global _rendered
+    with _lock:
+        if _rendered is None or _rendered[0] <= rev:
+            _rendered = (rev, html)
@@ -13,9 +13,11 @@ if [ ! -f "$DB_PATH" ]; then
   echo "[entrypoint] Initializing sample database at $DB_PATH"
   python - <<'PYCODE'
 from sqlmodel import Session, select
-from app.db import engine  # creates tables via metadata.create_all + lightweight migrate
+from app.db import engine, init_db
 from app.models import Beer, DisplaySettings
 
+init_db()  # creates tables via metadata.create_all + lightweight migrate
+
 with Session(engine) as session:
     # Seed beers only if totally empty
     if not session.exec(select(Beer).limit(1)).first():